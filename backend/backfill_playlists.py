@@ -0,0 +1,23 @@
+"""One-shot backfill/repair of playlist aggregates (track count, total duration, last thumbnail)
+
+Run this before the aggregate-maintaining server code serves playlist
+writes: adding a video increments track_count and total_duration_seconds
+from whatever is stored, and removing one sums duration_seconds per
+video, so playlists without those fields stay wrong until backfilled.
+Safe to re-run at any time to repair drift.
+"""
+import asyncio
+
+from server import backfill_playlist_aggregates, client, logger
+
+
+async def main():
+    try:
+        updated = await backfill_playlist_aggregates()
+        logger.info(f"Backfilled aggregates for {updated} playlists")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
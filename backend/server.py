@@ -1,14 +1,32 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Header, Request
+from fastapi.responses import Response
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import List, Optional, Union
 import uuid
+import re
+import io
+import json
+import secrets
+import time
+import random
+import marshal
+import pstats
+import cProfile
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
 from datetime import datetime
+from pymongo.errors import BulkWriteError
 import httpx
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
@@ -25,6 +43,66 @@ db = client[os.environ['DB_NAME']]
 YOUTUBE_API_KEY = os.environ.get('YOUTUBE_API_KEY')
 youtube_service = build('youtube', 'v3', developerKey=YOUTUBE_API_KEY)
 
+# Status heartbeat configuration
+STATUS_WRITE_BEHIND = os.environ.get('STATUS_WRITE_BEHIND', 'false').lower() in ('1', 'true', 'yes')
+STATUS_BATCH_SIZE = int(os.environ.get('STATUS_BATCH_SIZE', '500'))
+STATUS_FLUSH_INTERVAL = float(os.environ.get('STATUS_FLUSH_INTERVAL', '1.0'))
+STATUS_QUEUE_MAX = int(os.environ.get('STATUS_QUEUE_MAX', '10000'))
+STATUS_ENQUEUE_TIMEOUT = float(os.environ.get('STATUS_ENQUEUE_TIMEOUT', '0.5'))
+STATUS_TTL_SECONDS = int(os.environ.get('STATUS_TTL_SECONDS', str(7 * 24 * 3600)))
+
+# Profiling configuration
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', '1000'))
+PROFILE_BUFFER_SIZE = int(os.environ.get('PROFILE_BUFFER_SIZE', '50'))
+
+# Per-request span totals in ms (upstream, db, buffer, validation, serialization)
+_profile_spans = contextvars.ContextVar('profile_spans', default=None)
+# Stored profiles, oldest evicted first
+profile_buffer = deque(maxlen=PROFILE_BUFFER_SIZE)
+# cProfile hooks the whole thread, so only one request is profiled at a time
+_profiler_lock = threading.Lock()
+
+@contextmanager
+def profile_span(name: str):
+    """Add the wall time of the block to the current request's span totals"""
+    spans = _profile_spans.get()
+    if spans is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans[name] = spans.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+@lru_cache(maxsize=None)
+def _type_adapter(model):
+    return TypeAdapter(model)
+
+def model_response(content, model=None) -> Response:
+    """Validate content against model and encode it, timing each step.
+
+    Routes return this instead of leaning on response_model, whose
+    validation and encoding would otherwise run outside every span.
+    """
+    if model is None:
+        with profile_span("serialization"):
+            body = json.dumps(jsonable_encoder(content)).encode()
+        return Response(body, media_type="application/json")
+    adapter = _type_adapter(model)
+    with profile_span("validation"):
+        content = adapter.validate_python(content)
+    with profile_span("serialization"):
+        body = adapter.dump_json(content)
+    return Response(body, media_type="application/json")
+
+def is_admin(token: Optional[str]) -> bool:
+    if not ADMIN_TOKEN or token is None:
+        return False
+    return secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -40,6 +118,12 @@ class StatusCheck(BaseModel):
 class StatusCheckCreate(BaseModel):
     client_name: str
 
+class StatusCheckCount(BaseModel):
+    client_name: str
+    count: int
+    first_seen: datetime
+    last_seen: datetime
+
 class YouTubeVideo(BaseModel):
     id: str
     title: str
@@ -50,13 +134,18 @@ class YouTubeVideo(BaseModel):
     view_count: str
     published_at: str
 
-class Playlist(BaseModel):
+class PlaylistSummary(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
-    videos: List[YouTubeVideo] = []
+    track_count: int = 0
+    total_duration_seconds: int = 0
+    last_thumbnail_url: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+class Playlist(PlaylistSummary):
+    videos: List[YouTubeVideo] = []
+
 class PlaylistCreate(BaseModel):
     name: str
 
@@ -70,42 +159,85 @@ class PlaylistAddVideo(BaseModel):
     view_count: str
     published_at: str
 
+ISO_DURATION_RE = re.compile(
+    r'^P(?:(?P<days>\d+)D)?(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$'
+)
+
+def parse_iso_duration(duration: str) -> int:
+    """Convert a YouTube ISO-8601 duration (e.g. PT4M13S) to seconds, 0 if unparseable"""
+    match = ISO_DURATION_RE.match(duration or '')
+    if not match:
+        return 0
+    parts = {k: int(v or 0) for k, v in match.groupdict().items()}
+    return parts['days'] * 86400 + parts['hours'] * 3600 + parts['minutes'] * 60 + parts['seconds']
+
+def playlist_aggregates(videos: List[dict]) -> dict:
+    """Compute playlist aggregate fields from a full videos array"""
+    return {
+        "track_count": len(videos),
+        "total_duration_seconds": sum(
+            v.get("duration_seconds", parse_iso_duration(v.get("duration", ""))) for v in videos
+        ),
+        "last_thumbnail_url": videos[-1]["thumbnail_url"] if videos else None
+    }
+
+async def backfill_playlist_aggregates() -> int:
+    """Recompute aggregates and per-video duration_seconds for every playlist; returns playlists updated"""
+    updated = 0
+    async for playlist in db.playlists.find({}, {"id": 1, "videos": 1, "updated_at": 1}):
+        videos = playlist.get("videos", [])
+        for video in videos:
+            video["duration_seconds"] = parse_iso_duration(video.get("duration", ""))
+        # Only write if the playlist wasn't modified since we read it
+        result = await db.playlists.update_one(
+            {"id": playlist["id"], "updated_at": playlist.get("updated_at")},
+            {"$set": {"videos": videos, **playlist_aggregates(videos)}}
+        )
+        if result.modified_count:
+            updated += 1
+        elif result.matched_count == 0:
+            logger.warning(f"Playlist {playlist['id']} changed during backfill, skipped")
+    return updated
+
 # YouTube API Functions
 def search_youtube_videos(query: str, max_results: int = 20):
     """Search YouTube for videos"""
     try:
-        request = youtube_service.search().list(
-            part="snippet",
-            q=query,
-            type="video",
-            maxResults=max_results,
-            order="relevance"
-        )
-        search_response = request.execute()
+        with profile_span("upstream"):
+            request = youtube_service.search().list(
+                part="snippet",
+                q=query,
+                type="video",
+                maxResults=max_results,
+                order="relevance"
+            )
+            search_response = request.execute()
         
         video_ids = []
         for item in search_response['items']:
             video_ids.append(item['id']['videoId'])
         
         # Get video statistics and details
-        video_details = youtube_service.videos().list(
-            part="snippet,statistics,contentDetails",
-            id=",".join(video_ids)
-        ).execute()
+        with profile_span("upstream"):
+            video_details = youtube_service.videos().list(
+                part="snippet,statistics,contentDetails",
+                id=",".join(video_ids)
+            ).execute()
         
         videos = []
-        for item in video_details['items']:
-            video = YouTubeVideo(
-                id=item['id'],
-                title=item['snippet']['title'],
-                description=item['snippet']['description'][:500],  # Truncate description
-                thumbnail_url=item['snippet']['thumbnails']['medium']['url'],
-                duration=item['contentDetails']['duration'],
-                channel_title=item['snippet']['channelTitle'],
-                view_count=item['statistics'].get('viewCount', '0'),
-                published_at=item['snippet']['publishedAt']
-            )
-            videos.append(video)
+        with profile_span("validation"):
+            for item in video_details['items']:
+                video = YouTubeVideo(
+                    id=item['id'],
+                    title=item['snippet']['title'],
+                    description=item['snippet']['description'][:500],  # Truncate description
+                    thumbnail_url=item['snippet']['thumbnails']['medium']['url'],
+                    duration=item['contentDetails']['duration'],
+                    channel_title=item['snippet']['channelTitle'],
+                    view_count=item['statistics'].get('viewCount', '0'),
+                    published_at=item['snippet']['publishedAt']
+                )
+                videos.append(video)
         
         return videos
     
@@ -116,22 +248,151 @@ def search_youtube_videos(query: str, max_results: int = 20):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Status write-behind buffer
+_STATUS_STOP = object()
+
+class StatusWriteBehind:
+    """Buffer status documents and flush them with insert_many by size or time"""
+
+    def __init__(self, collection, batch_size: int, flush_interval: float, max_size: int):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = asyncio.Queue(maxsize=max_size)
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def enqueue(self, document: dict, timeout: float) -> bool:
+        """Wait up to timeout for buffer space; False means the buffer stayed full"""
+        try:
+            await asyncio.wait_for(self.queue.put(document), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _run(self):
+        # Runs until it reads the stop sentinel, so stop() can always
+        # rely on the flusher to free a slot for it
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            try:
+                first = await asyncio.wait_for(self.queue.get(), self.flush_interval)
+            except asyncio.TimeoutError:
+                continue
+            if first is _STATUS_STOP:
+                break
+            batch = [first]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STATUS_STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._write(batch)
+
+    async def _write(self, batch: List[dict]):
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            logger.error(f"Status batch partially failed: {len(e.details.get('writeErrors', []))} of {len(batch)} documents")
+        except Exception as e:
+            logger.error(f"Status batch of {len(batch)} documents failed: {e}")
+
+    async def stop(self):
+        """Let the flusher finish its current batch, then write everything still buffered"""
+        if self._task:
+            # The sentinel wakes an idle flusher and ends a partial batch;
+            # if the queue is full, the flusher frees a slot as it drains
+            await self.queue.put(_STATUS_STOP)
+            await self._task
+            self._task = None
+        batch = []
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is _STATUS_STOP:
+                continue
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                await self._write(batch)
+                batch = []
+        if batch:
+            await self._write(batch)
+
+status_buffer = StatusWriteBehind(
+    db.status_checks, STATUS_BATCH_SIZE, STATUS_FLUSH_INTERVAL, STATUS_QUEUE_MAX
+) if STATUS_WRITE_BEHIND else None
+
 # API Routes
 @api_router.get("/")
 async def root():
-    return {"message": "Welcome to Muse Music Player API"}
+    return model_response({"message": "Welcome to Muse Music Player API"})
 
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
     status_dict = input.dict()
     status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
-    return status_obj
+    if status_buffer is None:
+        with profile_span("db"):
+            _ = await db.status_checks.insert_one(status_obj.dict())
+    else:
+        with profile_span("buffer"):
+            queued = await status_buffer.enqueue(status_obj.dict(), STATUS_ENQUEUE_TIMEOUT)
+        if not queued:
+            raise HTTPException(
+                status_code=503,
+                detail="Status buffer full, retry later",
+                headers={"Retry-After": "1"}
+            )
+    return model_response(status_obj, StatusCheck)
+
+@api_router.get("/status", response_model=Union[List[StatusCheck], List[StatusCheckCount]])
+async def get_status_checks(
+    client_name: Optional[str] = Query(None, description="Only return checks from this client"),
+    start: Optional[datetime] = Query(None, description="Only return checks at or after this time"),
+    end: Optional[datetime] = Query(None, description="Only return checks before this time"),
+    aggregate: bool = Query(False, description="Return per-client counts instead of raw checks"),
+    limit: int = Query(1000, ge=1, le=1000, description="Maximum number of rows to return")
+):
+    """Get status checks, optionally filtered and aggregated per client"""
+    query = {}
+    if client_name:
+        query["client_name"] = client_name
+    if start or end:
+        query["timestamp"] = {}
+        if start:
+            query["timestamp"]["$gte"] = start
+        if end:
+            query["timestamp"]["$lt"] = end
 
-@api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+    if aggregate:
+        pipeline = [
+            {"$match": query},
+            {"$group": {
+                "_id": "$client_name",
+                "count": {"$sum": 1},
+                "first_seen": {"$min": "$timestamp"},
+                "last_seen": {"$max": "$timestamp"}
+            }},
+            {"$sort": {"count": -1}},
+            {"$limit": limit}
+        ]
+        with profile_span("db"):
+            counts = await db.status_checks.aggregate(pipeline).to_list(limit)
+        return model_response([{**c, "client_name": c["_id"]} for c in counts], List[StatusCheckCount])
+
+    with profile_span("db"):
+        status_checks = await db.status_checks.find(query, {"_id": 0}).sort("timestamp", -1).to_list(limit)
+    return model_response(status_checks, List[StatusCheck])
 
 @api_router.get("/search", response_model=List[YouTubeVideo])
 async def search_music(
@@ -143,33 +404,43 @@ async def search_music(
         raise HTTPException(status_code=500, detail="YouTube API key not configured")
     
     videos = search_youtube_videos(q, max_results)
-    return videos
+    return model_response(videos, List[YouTubeVideo])
 
 @api_router.post("/playlists", response_model=Playlist)
 async def create_playlist(playlist: PlaylistCreate):
     """Create a new playlist"""
     playlist_obj = Playlist(name=playlist.name)
-    await db.playlists.insert_one(playlist_obj.dict())
-    return playlist_obj
+    with profile_span("db"):
+        await db.playlists.insert_one(playlist_obj.dict())
+    return model_response(playlist_obj, Playlist)
 
-@api_router.get("/playlists", response_model=List[Playlist])
-async def get_playlists():
+@api_router.get("/playlists", response_model=Union[List[PlaylistSummary], List[Playlist]])
+async def get_playlists(
+    summary: bool = Query(False, description="Omit the videos array and return aggregates only")
+):
     """Get all playlists"""
-    playlists = await db.playlists.find().to_list(1000)
-    return [Playlist(**playlist) for playlist in playlists]
+    if summary:
+        with profile_span("db"):
+            playlists = await db.playlists.find({}, {"_id": 0, "videos": 0}).to_list(1000)
+        return model_response(playlists, List[PlaylistSummary])
+    with profile_span("db"):
+        playlists = await db.playlists.find().to_list(1000)
+    return model_response(playlists, List[Playlist])
 
 @api_router.get("/playlists/{playlist_id}", response_model=Playlist)
 async def get_playlist(playlist_id: str):
     """Get a specific playlist"""
-    playlist = await db.playlists.find_one({"id": playlist_id})
+    with profile_span("db"):
+        playlist = await db.playlists.find_one({"id": playlist_id})
     if not playlist:
         raise HTTPException(status_code=404, detail="Playlist not found")
-    return Playlist(**playlist)
+    return model_response(playlist, Playlist)
 
 @api_router.post("/playlists/{playlist_id}/videos")
 async def add_video_to_playlist(playlist_id: str, video: PlaylistAddVideo):
     """Add a video to a playlist"""
-    playlist = await db.playlists.find_one({"id": playlist_id})
+    with profile_span("db"):
+        playlist = await db.playlists.find_one({"id": playlist_id})
     if not playlist:
         raise HTTPException(status_code=404, detail="Playlist not found")
     
@@ -185,41 +456,99 @@ async def add_video_to_playlist(playlist_id: str, video: PlaylistAddVideo):
         published_at=video.published_at
     )
     
-    # Add video to playlist
-    await db.playlists.update_one(
-        {"id": playlist_id},
-        {
-            "$push": {"videos": youtube_video.dict()},
-            "$set": {"updated_at": datetime.utcnow()}
-        }
-    )
+    # Add video to playlist and bump aggregates in the same update.
+    # Playlists written before aggregates existed must be backfilled first
+    # (backfill_playlists.py), otherwise $inc starts counting from zero.
+    duration_seconds = parse_iso_duration(youtube_video.duration)
+    with profile_span("db"):
+        await db.playlists.update_one(
+            {"id": playlist_id},
+            {
+                "$push": {"videos": {**youtube_video.dict(), "duration_seconds": duration_seconds}},
+                "$inc": {"track_count": 1, "total_duration_seconds": duration_seconds},
+                "$set": {
+                    "last_thumbnail_url": youtube_video.thumbnail_url,
+                    "updated_at": datetime.utcnow()
+                }
+            }
+        )
     
-    return {"message": "Video added to playlist"}
+    return model_response({"message": "Video added to playlist"})
 
 @api_router.delete("/playlists/{playlist_id}/videos/{video_id}")
 async def remove_video_from_playlist(playlist_id: str, video_id: str):
     """Remove a video from a playlist"""
-    playlist = await db.playlists.find_one({"id": playlist_id})
+    with profile_span("db"):
+        playlist = await db.playlists.find_one({"id": playlist_id})
     if not playlist:
         raise HTTPException(status_code=404, detail="Playlist not found")
     
-    await db.playlists.update_one(
-        {"id": playlist_id},
-        {
-            "$pull": {"videos": {"id": video_id}},
-            "$set": {"updated_at": datetime.utcnow()}
-        }
-    )
+    # Pipeline update so the pull and the aggregates stay consistent even
+    # when the video appears more than once or the last track is removed
+    with profile_span("db"):
+        await db.playlists.update_one(
+            {"id": playlist_id},
+            [
+                {"$set": {"videos": {"$filter": {
+                    "input": {"$ifNull": ["$videos", []]},
+                    "cond": {"$ne": ["$$this.id", {"$literal": video_id}]}
+                }}}},
+                {"$set": {
+                    "track_count": {"$size": "$videos"},
+                    "total_duration_seconds": {"$sum": "$videos.duration_seconds"},
+                    "last_thumbnail_url": {"$ifNull": [{"$arrayElemAt": ["$videos.thumbnail_url", -1]}, None]},
+                    "updated_at": datetime.utcnow()
+                }}
+            ]
+        )
     
-    return {"message": "Video removed from playlist"}
+    return model_response({"message": "Video removed from playlist"})
 
 @api_router.delete("/playlists/{playlist_id}")
 async def delete_playlist(playlist_id: str):
     """Delete a playlist"""
-    result = await db.playlists.delete_one({"id": playlist_id})
+    with profile_span("db"):
+        result = await db.playlists.delete_one({"id": playlist_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Playlist not found")
-    return {"message": "Playlist deleted"}
+    return model_response({"message": "Playlist deleted"})
+
+@api_router.get("/admin/profiles")
+async def list_profiles(x_admin_token: Optional[str] = Header(None)):
+    """List stored request profiles, newest first"""
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+    return model_response([
+        {k: v for k, v in entry.items() if k != "profile"} | {"has_profile": entry["profile"] is not None}
+        for entry in reversed(profile_buffer)
+    ])
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def download_profile(
+    profile_id: str,
+    format: str = Query("pstats", pattern="^(pstats|text)$", description="pstats binary or text report"),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Download a stored cProfile profile (loadable with pstats.Stats)"""
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+    entry = next((e for e in profile_buffer if e["id"] == profile_id), None)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if entry["profile"] is None:
+        raise HTTPException(status_code=404, detail="Request was captured without a cProfile profile")
+    if format == "text":
+        out = io.StringIO()
+        stats = pstats.Stats(stream=out)
+        stats.stats = marshal.loads(entry["profile"])
+        stats.get_top_level_stats()
+        stats.sort_stats("cumulative").print_stats(50)
+        return Response(out.getvalue(), media_type="text/plain")
+    return Response(
+        entry["profile"],
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.prof"'}
+    )
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -232,6 +561,65 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """Track span timings per request; cProfile requests selected by admin header or sampling"""
+    if request.url.path.startswith("/api/admin/"):
+        return await call_next(request)
+
+    spans = {}
+    token = _profile_spans.set(spans)
+    selected = (
+        (request.headers.get("x-profile") == "1" and is_admin(request.headers.get("x-admin-token")))
+        or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+    )
+    profiler = None
+    if selected and _profiler_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    response, error = None, None
+    try:
+        response = await call_next(request)
+    except Exception as e:
+        # Capture failed requests too, then let the error propagate
+        error = e
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if profiler is not None:
+            profiler.disable()
+            _profiler_lock.release()
+        _profile_spans.reset(token)
+
+    profile_id = None
+    if profiler is not None or elapsed_ms >= PROFILE_SLOW_MS:
+        data = None
+        if profiler is not None:
+            profiler.create_stats()
+            data = marshal.dumps(profiler.stats)
+        # Whatever the spans miss: routing, request parsing, middleware, profiler overhead
+        spans_ms = {k: round(v, 2) for k, v in spans.items()}
+        spans_ms["unaccounted"] = round(max(elapsed_ms - sum(spans.values()), 0.0), 2)
+        profile_id = str(uuid.uuid4())
+        profile_buffer.append({
+            "id": profile_id,
+            "method": request.method,
+            "path": request.url.path,
+            "query": request.url.query,
+            "status_code": response.status_code if response is not None else 500,
+            "error": repr(error) if error is not None else None,
+            "duration_ms": round(elapsed_ms, 2),
+            "spans_ms": spans_ms,
+            "slow": elapsed_ms >= PROFILE_SLOW_MS,
+            "captured_at": datetime.utcnow().isoformat(),
+            "profile": data
+        })
+    if error is not None:
+        raise error
+    if profile_id is not None:
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -239,6 +627,34 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def ensure_status_indexes():
+    """Create the status indexes, updating the TTL in place if it changed"""
+    indexes = await db.status_checks.index_information()
+    ttl_index = indexes.get("timestamp_ttl")
+    if ttl_index is None:
+        # Expire old heartbeats; timestamp is also the range filter key
+        await db.status_checks.create_index(
+            "timestamp", expireAfterSeconds=STATUS_TTL_SECONDS, name="timestamp_ttl"
+        )
+    elif ttl_index.get("expireAfterSeconds") != STATUS_TTL_SECONDS:
+        # create_index would fail with an options conflict
+        await db.command({
+            "collMod": "status_checks",
+            "index": {"name": "timestamp_ttl", "expireAfterSeconds": STATUS_TTL_SECONDS}
+        })
+    await db.status_checks.create_index([("client_name", 1), ("timestamp", -1)])
+
+@app.on_event("startup")
+async def startup_status_checks():
+    if status_buffer is not None:
+        status_buffer.start()
+    try:
+        await ensure_status_indexes()
+    except Exception as e:
+        logger.error(f"Could not ensure status_checks indexes: {e}")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    if status_buffer is not None:
+        await status_buffer.stop()
+    client.close()
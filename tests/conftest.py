@@ -0,0 +1,106 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = list(docs)
+        self.sort_args = None
+
+    def sort(self, *args):
+        self.sort_args = args
+        return self
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+    def __aiter__(self):
+        self._iter = iter(self.docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeCollection:
+    """Records Motor calls and serves canned documents"""
+
+    def __init__(self, docs=None):
+        self.docs = list(docs or [])
+        self.calls = []
+        self.inserted = []
+        self.indexes = {"_id_": {"key": [("_id", 1)]}}
+
+    async def insert_one(self, doc):
+        self.calls.append(("insert_one", doc))
+        self.inserted.append(doc)
+
+    async def insert_many(self, docs, ordered=True):
+        self.calls.append(("insert_many", list(docs), ordered))
+        self.inserted.extend(docs)
+
+    def find(self, query=None, projection=None):
+        self.calls.append(("find", query, projection))
+        excluded = {k for k, v in (projection or {}).items() if not v}
+        return FakeCursor({k: v for k, v in d.items() if k not in excluded} for d in self.docs)
+
+    async def find_one(self, query):
+        self.calls.append(("find_one", query))
+        return next((d for d in self.docs if all(d.get(k) == v for k, v in query.items())), None)
+
+    def aggregate(self, pipeline):
+        self.calls.append(("aggregate", pipeline))
+        return FakeCursor(self.docs)
+
+    async def update_one(self, query, update):
+        self.calls.append(("update_one", query, update))
+        matched = [d for d in self.docs if all(d.get(k) == v for k, v in query.items())]
+        return UpdateResult(len(matched[:1]), len(matched[:1]))
+
+    async def index_information(self):
+        self.calls.append(("index_information",))
+        return self.indexes
+
+    async def create_index(self, keys, **kwargs):
+        self.calls.append(("create_index", keys, kwargs))
+
+    async def delete_one(self, query):
+        self.calls.append(("delete_one", query))
+        return DeleteResult(1 if any(d.get("id") == query.get("id") for d in self.docs) else 0)
+
+
+class UpdateResult:
+    def __init__(self, matched_count, modified_count):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+
+
+class DeleteResult:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
+
+class FakeDB:
+    def __init__(self):
+        self.status_checks = FakeCollection()
+        self.playlists = FakeCollection()
+        self.commands = []
+
+    async def command(self, command):
+        self.commands.append(command)
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = FakeDB()
+    monkeypatch.setattr(server, "db", db)
+    return db
@@ -0,0 +1,129 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from tests.conftest import FakeCollection, UpdateResult
+
+
+def video(video_id, duration="PT1M", thumbnail=None, **extra):
+    return {
+        "id": video_id,
+        "title": video_id,
+        "description": "",
+        "thumbnail_url": thumbnail or f"https://img/{video_id}.jpg",
+        "duration": duration,
+        "channel_title": "channel",
+        "view_count": "0",
+        "published_at": "2024-01-01T00:00:00Z",
+        **extra,
+    }
+
+
+def playlist(playlist_id, videos, **extra):
+    now = datetime(2024, 1, 1)
+    return {"id": playlist_id, "name": playlist_id, "videos": videos,
+            "created_at": now, "updated_at": now, **extra}
+
+
+@pytest.mark.parametrize("duration, seconds", [
+    ("PT4M13S", 253),
+    ("PT1H", 3600),
+    ("P1DT2H", 93600),
+    ("P1DT2S", 86402),
+    ("PT45S", 45),
+    ("P0D", 0),
+    ("PT", 0),
+    ("", 0),
+    (None, 0),
+    ("4:13", 0),
+    ("PT4M13", 0),
+    ("garbage", 0),
+])
+def test_parse_iso_duration(duration, seconds):
+    assert server.parse_iso_duration(duration) == seconds
+
+
+def test_playlist_aggregates():
+    videos = [video("a", "PT1M"), video("b", "PT30S", duration_seconds=31), video("c", "PT1H", thumbnail="t")]
+    assert server.playlist_aggregates(videos) == {
+        "track_count": 3,
+        "total_duration_seconds": 60 + 31 + 3600,
+        "last_thumbnail_url": "t",
+    }
+
+
+def test_playlist_aggregates_empty():
+    assert server.playlist_aggregates([]) == {
+        "track_count": 0, "total_duration_seconds": 0, "last_thumbnail_url": None
+    }
+
+
+def test_backfill_sets_aggregates_and_durations(fake_db):
+    fake_db.playlists.docs = [playlist("p1", [video("a", "PT2M"), video("b", "PT1M", thumbnail="t")]),
+                              playlist("p2", [])]
+    assert asyncio.run(server.backfill_playlist_aggregates()) == 2
+
+    updates = [c for c in fake_db.playlists.calls if c[0] == "update_one"]
+    query, update = updates[0][1], updates[0][2]["$set"]
+    assert query == {"id": "p1", "updated_at": datetime(2024, 1, 1)}
+    assert [v["duration_seconds"] for v in update["videos"]] == [120, 60]
+    assert update["track_count"] == 2
+    assert update["total_duration_seconds"] == 180
+    assert update["last_thumbnail_url"] == "t"
+    assert updates[1][2]["$set"]["last_thumbnail_url"] is None
+
+
+def test_backfill_skips_playlists_changed_mid_run(fake_db):
+    class RacingCollection(FakeCollection):
+        async def update_one(self, query, update):
+            self.calls.append(("update_one", query, update))
+            if query["id"] == "p1":
+                return UpdateResult(0, 0)
+            return UpdateResult(1, 1)
+
+    fake_db.playlists = RacingCollection([playlist("p1", [video("a")]), playlist("p2", [video("b")])])
+    assert asyncio.run(server.backfill_playlist_aggregates()) == 1
+
+
+def test_list_summary_omits_videos(fake_db):
+    fake_db.playlists.docs = [playlist("p1", [video("a")], track_count=1, total_duration_seconds=60,
+                                       last_thumbnail_url="t")]
+    response = TestClient(server.app).get("/api/playlists", params={"summary": "true"})
+    assert response.status_code == 200
+    body = response.json()
+    assert "videos" not in body[0]
+    assert body[0]["track_count"] == 1
+    assert body[0]["total_duration_seconds"] == 60
+    assert fake_db.playlists.calls[0][2] == {"_id": 0, "videos": 0}
+
+
+def test_list_and_detail_include_aggregates(fake_db):
+    fake_db.playlists.docs = [playlist("p1", [video("a")], track_count=1, total_duration_seconds=60)]
+    client = TestClient(server.app)
+    assert client.get("/api/playlists").json()[0]["videos"][0]["id"] == "a"
+    detail = client.get("/api/playlists/p1").json()
+    assert detail["track_count"] == 1 and len(detail["videos"]) == 1
+
+
+def test_add_video_updates_aggregates_atomically(fake_db):
+    fake_db.playlists.docs = [playlist("p1", [])]
+    body = {k: v for k, v in video("a", "PT3M", thumbnail="t").items() if k != "id"}
+    response = TestClient(server.app).post("/api/playlists/p1/videos", json={"video_id": "a", **body})
+    assert response.status_code == 200
+    _, _, update = fake_db.playlists.calls[-1]
+    assert update["$push"]["videos"]["duration_seconds"] == 180
+    assert update["$inc"] == {"track_count": 1, "total_duration_seconds": 180}
+    assert update["$set"]["last_thumbnail_url"] == "t"
+
+
+def test_remove_video_quotes_path_value(fake_db):
+    fake_db.playlists.docs = [playlist("p1", [video("a")])]
+    response = TestClient(server.app).delete("/api/playlists/p1/videos/$$this.id")
+    assert response.status_code == 200
+    _, _, pipeline = fake_db.playlists.calls[-1]
+    cond = pipeline[0]["$set"]["videos"]["$filter"]["cond"]
+    assert cond == {"$ne": ["$$this.id", {"$literal": "$$this.id"}]}
+    assert pipeline[1]["$set"]["track_count"] == {"$size": "$videos"}
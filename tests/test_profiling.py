@@ -0,0 +1,223 @@
+import marshal
+from collections import deque
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+ADMIN = {"X-Admin-Token": "secret"}
+
+
+@pytest.fixture
+def client(monkeypatch, fake_db):
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(server, "PROFILE_SAMPLE_RATE", 0.0)
+    monkeypatch.setattr(server, "PROFILE_SLOW_MS", 60_000.0)
+    monkeypatch.setattr(server, "profile_buffer", deque(maxlen=3))
+    return TestClient(server.app)
+
+
+def test_unselected_fast_request_is_not_captured(client):
+    response = client.get("/api/")
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+    assert len(server.profile_buffer) == 0
+
+
+def test_admin_header_selects_request(client):
+    response = client.get("/api/", headers={"X-Profile": "1", **ADMIN})
+    entry = server.profile_buffer[-1]
+    assert response.headers["X-Profile-Id"] == entry["id"]
+    assert entry["profile"] is not None
+    assert entry["slow"] is False
+    assert isinstance(marshal.loads(entry["profile"]), dict)
+
+
+@pytest.mark.parametrize("headers", [
+    {"X-Profile": "1"},
+    {"X-Profile": "1", "X-Admin-Token": "wrong"},
+])
+def test_profile_header_requires_valid_token(client, headers):
+    response = client.get("/api/", headers=headers)
+    assert "X-Profile-Id" not in response.headers
+    assert len(server.profile_buffer) == 0
+
+
+def test_profile_header_ignored_without_configured_token(client, monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_TOKEN", None)
+    client.get("/api/", headers={"X-Profile": "1", "X-Admin-Token": ""})
+    assert len(server.profile_buffer) == 0
+
+
+def test_sampling_selects_request(client, monkeypatch):
+    monkeypatch.setattr(server, "PROFILE_SAMPLE_RATE", 0.5)
+    monkeypatch.setattr(server.random, "random", lambda: 0.4)
+    client.get("/api/")
+    assert server.profile_buffer[-1]["profile"] is not None
+
+
+def test_sampling_skips_request(client, monkeypatch):
+    monkeypatch.setattr(server, "PROFILE_SAMPLE_RATE", 0.5)
+    monkeypatch.setattr(server.random, "random", lambda: 0.6)
+    client.get("/api/")
+    assert len(server.profile_buffer) == 0
+
+
+def test_slow_request_captured_without_profile(client, monkeypatch):
+    monkeypatch.setattr(server, "PROFILE_SLOW_MS", 0.0)
+    response = client.get("/api/")
+    entry = server.profile_buffer[-1]
+    assert response.headers["X-Profile-Id"] == entry["id"]
+    assert entry["slow"] is True
+    assert entry["profile"] is None
+    assert entry["path"] == "/api/"
+
+
+def test_ring_buffer_evicts_oldest(client, monkeypatch):
+    monkeypatch.setattr(server, "PROFILE_SLOW_MS", 0.0)
+    ids = [client.get("/api/").headers["X-Profile-Id"] for _ in range(5)]
+    assert [e["id"] for e in server.profile_buffer] == ids[-3:]
+
+
+def test_span_breakdown_for_playlist_detail(client, fake_db):
+    now = datetime(2024, 1, 1)
+    fake_db.playlists.docs = [{"id": "p1", "name": "p1", "videos": [], "created_at": now, "updated_at": now}]
+    response = client.get("/api/playlists/p1", headers={"X-Profile": "1", **ADMIN})
+    assert response.json()["id"] == "p1"
+    spans = server.profile_buffer[-1]["spans_ms"]
+    assert {"db", "validation", "serialization", "unaccounted"} <= set(spans)
+
+
+def test_mutation_records_db_span(client, fake_db):
+    fake_db.playlists.docs = [{"id": "p1"}]
+    client.delete("/api/playlists/p1", headers={"X-Profile": "1", **ADMIN})
+    assert "db" in server.profile_buffer[-1]["spans_ms"]
+
+
+def test_admin_endpoints_are_not_captured(client, monkeypatch):
+    monkeypatch.setattr(server, "PROFILE_SLOW_MS", 0.0)
+    client.get("/api/admin/profiles", headers=ADMIN)
+    assert len(server.profile_buffer) == 0
+
+
+@pytest.mark.parametrize("path", ["/api/admin/profiles", "/api/admin/profiles/some-id"])
+@pytest.mark.parametrize("headers", [{}, {"X-Admin-Token": "wrong"}])
+def test_admin_endpoints_require_token(client, path, headers):
+    assert client.get(path, headers=headers).status_code == 403
+
+
+def test_list_profiles(client):
+    client.get("/api/", headers={"X-Profile": "1", **ADMIN})
+    listed = client.get("/api/admin/profiles", headers=ADMIN).json()
+    assert listed[0]["has_profile"] is True
+    assert "profile" not in listed[0]
+
+
+def test_download_unknown_profile_is_404(client):
+    assert client.get("/api/admin/profiles/missing", headers=ADMIN).status_code == 404
+
+
+def test_download_slow_capture_without_profile_is_404(client, monkeypatch):
+    monkeypatch.setattr(server, "PROFILE_SLOW_MS", 0.0)
+    profile_id = client.get("/api/").headers["X-Profile-Id"]
+    assert client.get(f"/api/admin/profiles/{profile_id}", headers=ADMIN).status_code == 404
+
+
+def test_download_profile(client, tmp_path):
+    import pstats
+
+    profile_id = client.get("/api/", headers={"X-Profile": "1", **ADMIN}).headers["X-Profile-Id"]
+    response = client.get(f"/api/admin/profiles/{profile_id}", headers=ADMIN)
+    assert response.status_code == 200
+    path = tmp_path / "p.prof"
+    path.write_bytes(response.content)
+    assert pstats.Stats(str(path)).total_calls > 0
+
+    text = client.get(f"/api/admin/profiles/{profile_id}", params={"format": "text"}, headers=ADMIN)
+    assert "function calls" in text.text
+
+
+class FakeRequest:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+
+class FakeYouTube:
+    def search(self):
+        return self
+
+    def videos(self):
+        return self
+
+    def list(self, **kwargs):
+        if "q" in kwargs:
+            return FakeRequest({"items": [{"id": {"videoId": "v1"}}]})
+        return FakeRequest({"items": [{
+            "id": "v1",
+            "snippet": {
+                "title": "t", "description": "d", "channelTitle": "c",
+                "publishedAt": "2024-01-01T00:00:00Z",
+                "thumbnails": {"medium": {"url": "https://img/v1.jpg"}},
+            },
+            "contentDetails": {"duration": "PT3M"},
+            "statistics": {"viewCount": "7"},
+        }]})
+
+
+def test_search_splits_upstream_and_validation(client, monkeypatch):
+    monkeypatch.setattr(server, "YOUTUBE_API_KEY", "key")
+    monkeypatch.setattr(server, "youtube_service", FakeYouTube())
+    response = client.get("/api/search", params={"q": "x"}, headers={"X-Profile": "1", **ADMIN})
+    assert response.json()[0]["id"] == "v1"
+    spans = server.profile_buffer[-1]["spans_ms"]
+    assert {"upstream", "validation", "serialization"} <= set(spans)
+
+
+def test_write_endpoint_records_validation_and_serialization(client):
+    response = client.post("/api/playlists", json={"name": "p"}, headers={"X-Profile": "1", **ADMIN})
+    assert response.json()["name"] == "p"
+    assert {"db", "validation", "serialization"} <= set(server.profile_buffer[-1]["spans_ms"])
+
+
+def test_model_response_rejects_content_not_matching_model():
+    from pydantic import ValidationError
+
+    with pytest.raises(ValidationError):
+        server.model_response([{"name": "missing fields"}], server.List[server.StatusCheck])
+
+
+def test_failed_request_is_captured(client, fake_db, monkeypatch):
+    async def broken(query):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(server, "PROFILE_SLOW_MS", 0.0)
+    monkeypatch.setattr(fake_db.playlists, "find_one", broken)
+    failing = TestClient(server.app, raise_server_exceptions=False)
+    assert failing.get("/api/playlists/p1").status_code == 500
+    entry = server.profile_buffer[-1]
+    assert entry["status_code"] == 500
+    assert "boom" in entry["error"]
+    assert "db" in entry["spans_ms"]
+
+
+def test_admin_token_uses_constant_time_compare(client, monkeypatch):
+    compared = []
+
+    def compare_digest(a, b):
+        compared.append((a, b))
+        return a == b
+
+    monkeypatch.setattr(server.secrets, "compare_digest", compare_digest)
+    assert server.is_admin("secret")
+    assert not server.is_admin("nope")
+    assert not server.is_admin(None)
+    assert compared == [(b"secret", b"secret"), (b"nope", b"secret")]
+
+
+def test_non_ascii_admin_token_is_rejected(client):
+    assert not server.is_admin("sécret")
@@ -0,0 +1,199 @@
+import asyncio
+import json
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+import server
+from tests.conftest import FakeCollection
+
+
+class SlowCollection(FakeCollection):
+    async def insert_many(self, docs, ordered=True):
+        await asyncio.sleep(0.05)
+        await super().insert_many(docs, ordered)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_flush_by_size():
+    async def scenario():
+        collection = FakeCollection()
+        buffer = server.StatusWriteBehind(collection, batch_size=10, flush_interval=60, max_size=100)
+        buffer.start()
+        for i in range(25):
+            assert await buffer.enqueue({"n": i}, timeout=1)
+        await asyncio.sleep(0.05)
+        batches = [c[1] for c in collection.calls if c[0] == "insert_many"]
+        await buffer.stop()
+        return batches, collection
+
+    batches, collection = run(scenario())
+    assert [len(b) for b in batches] == [10, 10]
+    assert all(c[2] is False for c in collection.calls)
+    assert [d["n"] for d in collection.inserted] == list(range(25))
+
+
+def test_flush_by_interval():
+    async def scenario():
+        collection = FakeCollection()
+        buffer = server.StatusWriteBehind(collection, batch_size=100, flush_interval=0.05, max_size=100)
+        buffer.start()
+        for i in range(3):
+            await buffer.enqueue({"n": i}, timeout=1)
+        await asyncio.sleep(0.2)
+        written = len(collection.inserted)
+        await buffer.stop()
+        return written
+
+    assert run(scenario()) == 3
+
+
+def test_enqueue_times_out_when_full():
+    async def scenario():
+        buffer = server.StatusWriteBehind(FakeCollection(), batch_size=10, flush_interval=60, max_size=2)
+        assert await buffer.enqueue({"n": 0}, timeout=0.01)
+        assert await buffer.enqueue({"n": 1}, timeout=0.01)
+        return await buffer.enqueue({"n": 2}, timeout=0.01)
+
+    assert run(scenario()) is False
+
+
+def test_stop_writes_in_flight_and_buffered_documents():
+    async def scenario():
+        collection = SlowCollection()
+        buffer = server.StatusWriteBehind(collection, batch_size=50, flush_interval=60, max_size=1000)
+        buffer.start()
+        for i in range(300):
+            await buffer.enqueue({"n": i}, timeout=1)
+        await asyncio.sleep(0.1)
+        await buffer.stop()
+        return collection
+
+    collection = run(scenario())
+    assert sorted(d["n"] for d in collection.inserted) == list(range(300))
+
+
+def test_stop_with_full_queue():
+    async def scenario():
+        collection = FakeCollection()
+        buffer = server.StatusWriteBehind(collection, batch_size=5, flush_interval=60, max_size=3)
+        buffer.start()
+        await asyncio.sleep(0)
+        for i in range(3):
+            buffer.queue.put_nowait({"n": i})
+        await buffer.stop()
+        return collection
+
+    collection = run(scenario())
+    assert sorted(d["n"] for d in collection.inserted) == [0, 1, 2]
+
+
+def test_stop_while_write_in_flight_and_queue_full():
+    async def scenario():
+        collection = SlowCollection()
+        buffer = server.StatusWriteBehind(collection, batch_size=2, flush_interval=60, max_size=3)
+        buffer.start()
+        for i in range(5):
+            await buffer.enqueue({"n": i}, timeout=1)
+        await asyncio.sleep(0.01)
+        assert buffer.queue.full()
+        await asyncio.wait_for(buffer.stop(), timeout=2)
+        return collection
+
+    collection = run(scenario())
+    assert sorted(d["n"] for d in collection.inserted) == list(range(5))
+
+
+def test_indexes_created_on_first_start(fake_db):
+    run(server.ensure_status_indexes())
+    creates = [c for c in fake_db.status_checks.calls if c[0] == "create_index"]
+    assert creates[0][1:] == ("timestamp", {"expireAfterSeconds": server.STATUS_TTL_SECONDS, "name": "timestamp_ttl"})
+    assert fake_db.commands == []
+
+
+def test_changed_ttl_uses_collmod(fake_db):
+    fake_db.status_checks.indexes["timestamp_ttl"] = {"key": [("timestamp", 1)], "expireAfterSeconds": 1}
+    run(server.ensure_status_indexes())
+    creates = [c for c in fake_db.status_checks.calls if c[0] == "create_index"]
+    assert all(c[1] != "timestamp" for c in creates)
+    assert fake_db.commands == [{
+        "collMod": "status_checks",
+        "index": {"name": "timestamp_ttl", "expireAfterSeconds": server.STATUS_TTL_SECONDS}
+    }]
+
+
+def test_unchanged_ttl_is_left_alone(fake_db):
+    fake_db.status_checks.indexes["timestamp_ttl"] = {
+        "key": [("timestamp", 1)], "expireAfterSeconds": server.STATUS_TTL_SECONDS
+    }
+    run(server.ensure_status_indexes())
+    assert fake_db.commands == []
+
+
+def test_startup_survives_unreachable_mongo(monkeypatch, fake_db):
+    async def unreachable():
+        raise ConnectionError("no mongo")
+
+    monkeypatch.setattr(fake_db.status_checks, "index_information", unreachable)
+    monkeypatch.setattr(server, "status_buffer", None)
+    run(server.startup_status_checks())
+
+
+def test_post_status_returns_503_when_buffer_full(monkeypatch, fake_db):
+    class FullBuffer:
+        async def enqueue(self, document, timeout):
+            return False
+
+    monkeypatch.setattr(server, "status_buffer", FullBuffer())
+    response = TestClient(server.app).post("/api/status", json={"client_name": "a"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert fake_db.status_checks.inserted == []
+
+
+def test_post_status_writes_directly_without_buffer(monkeypatch, fake_db):
+    monkeypatch.setattr(server, "status_buffer", None)
+    response = TestClient(server.app).post("/api/status", json={"client_name": "a"})
+    assert response.status_code == 200
+    assert fake_db.status_checks.inserted[0]["client_name"] == "a"
+
+
+def get_status(**kwargs):
+    params = {"client_name": None, "start": None, "end": None, "aggregate": False, "limit": 1000}
+    params.update(kwargs)
+    return run(server.get_status_checks(**params))
+
+
+def test_get_status_filters(fake_db):
+    start, end = datetime(2024, 1, 1), datetime(2024, 1, 2)
+    get_status(client_name="a", start=start, end=end, limit=10)
+    _, query, projection = fake_db.status_checks.calls[0]
+    assert query == {"client_name": "a", "timestamp": {"$gte": start, "$lt": end}}
+    assert projection == {"_id": 0}
+
+
+def test_get_status_open_ended_range(fake_db):
+    start = datetime(2024, 1, 1)
+    get_status(start=start)
+    assert fake_db.status_checks.calls[0][1] == {"timestamp": {"$gte": start}}
+
+
+def test_get_status_without_filters(fake_db):
+    get_status()
+    assert fake_db.status_checks.calls[0][1] == {}
+
+
+def test_get_status_aggregate(fake_db):
+    seen = datetime(2024, 1, 1)
+    fake_db.status_checks.docs = [{"_id": "a", "count": 3, "first_seen": seen, "last_seen": seen}]
+    counts = get_status(client_name="a", aggregate=True, limit=5)
+    _, pipeline = fake_db.status_checks.calls[0]
+    assert pipeline[0] == {"$match": {"client_name": "a"}}
+    assert pipeline[1]["$group"]["_id"] == "$client_name"
+    assert pipeline[-1] == {"$limit": 5}
+    counts = json.loads(counts.body)
+    assert counts[0]["client_name"] == "a" and counts[0]["count"] == 3
+    assert counts[0]["last_seen"] == "2024-01-01T00:00:00"